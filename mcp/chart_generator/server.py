@@ -15,7 +15,7 @@ from typing import Any
 
 from mcp.server.fastmcp import FastMCP, Context
 from mcp.server.transport_security import TransportSecuritySettings
-from starlette.responses import FileResponse, Response
+from starlette.responses import Response
 
 try:
     from .charts import (
@@ -31,7 +31,6 @@ try:
     )
     from .storage import ChartStorage
     from .themes import ThemeType, get_theme_info
-    from shared.context import get_conversation_id
 except ImportError:
     # When running directly with mcp dev
     from charts import (
@@ -48,16 +47,8 @@ except ImportError:
     from storage import ChartStorage
     from themes import ThemeType, get_theme_info
 
-    def get_conversation_id(ctx: Context) -> str:
-        """Fallback for mcp dev mode."""
-        try:
-            if ctx.request_context and ctx.request_context.request:
-                raw_conv_id = ctx.request_context.request.headers.get("X-Conversation-ID")
-                if raw_conv_id:
-                    return "".join(c if c.isalnum() or c in "-_" else "_" for c in raw_conv_id[:64])
-        except Exception:
-            pass
-        return "_shared"
+from shared.context import get_conversation_id
+from shared.files import serve_conversation_file
 
 
 # Configure logging
@@ -118,32 +109,11 @@ async def health_check(request) -> Response:
 @mcp.custom_route("/files/{conv_id}/{filename}", methods=["GET"])
 async def serve_file(request) -> Response:
     """Serve generated chart files."""
-    conv_id = request.path_params.get("conv_id", "_shared")
-    filename = request.path_params.get("filename", "")
+    return await serve_conversation_file(request, DATA_DIR)
 
-    # Sanitize inputs to prevent path traversal
-    safe_conv_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in conv_id[:64])
-    safe_filename = Path(filename).name  # Remove any path components
 
-    file_path = DATA_DIR / safe_conv_id / safe_filename
-
-    if not file_path.exists():
-        return Response(content="File not found", status_code=404)
-
-    # Verify file is within DATA_DIR (security check)
-    try:
-        file_path.resolve().relative_to(DATA_DIR.resolve())
-    except ValueError:
-        return Response(content="Access denied", status_code=403)
-
-    return FileResponse(file_path)
-
-
-def calculate_pixel_dimensions(
-    format: FormatType = "square",
-    quality: QualityType = "high",
-) -> tuple[int, int]:
-    """Calculate pixel dimensions from format and quality."""
+def _compute_pixel_dimensions(format: str, quality: str) -> tuple[int, int]:
+    """Compute pixel dimensions from format and quality presets."""
     ratio_w, ratio_h = FORMAT_RATIOS.get(format, (1, 1))
     max_pixels = QUALITY_SIZES.get(quality, 1024)
 
@@ -157,6 +127,26 @@ def calculate_pixel_dimensions(
     return width, height
 
 
+# Pixel dimensions for every (format, quality) preset pair, built once at import
+_PIXEL_DIMENSIONS: dict[tuple[str, str], tuple[int, int]] = {
+    (format, quality): _compute_pixel_dimensions(format, quality)
+    for format in FORMAT_RATIOS
+    for quality in QUALITY_SIZES
+}
+
+
+def calculate_pixel_dimensions(
+    format: FormatType = "square",
+    quality: QualityType = "high",
+) -> tuple[int, int]:
+    """Calculate pixel dimensions from format and quality."""
+    dimensions = _PIXEL_DIMENSIONS.get((format, quality))
+    if dimensions is None:
+        # Unknown preset: fall back to the same defaults as the presets do
+        dimensions = _compute_pixel_dimensions(format, quality)
+    return dimensions
+
+
 @mcp.tool()
 async def generate_chart(
     ctx: Context,
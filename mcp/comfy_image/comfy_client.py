@@ -1,21 +1,55 @@
 """
 Async HTTP client for ComfyUI API.
 
-Handles workflow submission, polling for completion, and image retrieval.
+Handles workflow submission, waiting for completion, and image retrieval.
+Completion is pushed over ComfyUI's /ws endpoint, with /history polling
+as the fallback while the WebSocket can't be reached.
 """
 
 from __future__ import annotations
 
 import asyncio
+import itertools
+import json
+import logging
 import os
+import time
 import uuid
+from pathlib import Path
 from typing import Any
 
 import httpx
+import websockets
+
+logger = logging.getLogger(__name__)
 
 COMFY_URL = os.getenv("COMFY_URL", "http://localhost:8188")
 DEFAULT_TIMEOUT = float(os.getenv("COMFY_TIMEOUT", "1800"))  # 30 minutes default
-POLL_INTERVAL = 0.5  # seconds
+# Polling backoff (seconds): start fast for short jobs, slow down for long ones
+POLL_MIN_INTERVAL = 0.3
+POLL_MAX_INTERVAL = 3.0
+POLL_BACKOFF = 1.25
+POLL_ERROR_MAX_INTERVAL = 60.0  # Cap when backing off on HTTP errors
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # bytes
+
+# Connection pool shared by concurrent tool calls and parallel downloads
+HTTP_LIMITS = httpx.Limits(
+    max_connections=20,
+    max_keepalive_connections=10,
+    keepalive_expiry=60,
+)
+HTTP_CONNECT_RETRIES = 1
+WS_RECHECK_INTERVAL = 5.0  # seconds between safety history checks while listening
+WS_RETRY_COOLDOWN = 60.0  # seconds to poll instead after a failed WebSocket connect
+AVAILABILITY_TTL = 5.0  # seconds an is_available() result is reused
+
+# Client IDs: one random per-process prefix (unique across hosts and
+# containers) plus a cheap counter for each client created
+_CLIENT_ID_PREFIX = uuid.uuid4().hex
+_client_counter = itertools.count()
+
+# WebSocket message types that mean a prompt has stopped executing
+_WS_TERMINAL_TYPES = {"execution_success", "execution_error", "execution_interrupted"}
 
 
 class ComfyClient:
@@ -23,7 +57,40 @@ class ComfyClient:
 
     def __init__(self, base_url: str = COMFY_URL):
         self.base_url = base_url.rstrip("/")
-        self.client_id = str(uuid.uuid4())
+        self.client_id = f"{_CLIENT_ID_PREFIX}-{next(_client_counter)}"
+        # Single pooled client so polling and downloads reuse keep-alive connections
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=30.0,
+            transport=httpx.AsyncHTTPTransport(
+                limits=HTTP_LIMITS,
+                retries=HTTP_CONNECT_RETRIES,  # Retries failed connects only
+            ),
+        )
+        # WebSocket listener state (see _ensure_listener)
+        self._ws_task: asyncio.Task | None = None
+        self._ws_lock = asyncio.Lock()
+        self._completion_events: dict[str, asyncio.Event] = {}
+        self._ws_failed_at: float | None = None  # monotonic time of the last failed connect
+        # (monotonic timestamp, result) of the last is_available() check
+        self._avail_cache: tuple[float, bool] | None = None
+
+    async def aclose(self) -> None:
+        """Close the WebSocket listener and the HTTP connection pool."""
+        if self._ws_task is not None:
+            self._ws_task.cancel()
+            try:
+                await self._ws_task
+            except asyncio.CancelledError:
+                pass
+            self._ws_task = None
+        await self._client.aclose()
+
+    async def __aenter__(self) -> "ComfyClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
 
     async def queue_prompt(self, workflow: dict[str, Any]) -> str:
         """
@@ -35,20 +102,22 @@ class ComfyClient:
         Returns:
             The prompt_id for tracking the job
         """
+        # Subscribe before submitting so no completion message is missed
+        await self._ensure_listener()
+
         payload = {
             "prompt": workflow,
             "client_id": self.client_id,
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/prompt",
-                json=payload,
-                timeout=30.0,
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data["prompt_id"]
+        response = await self._client.post(
+            "/prompt",
+            json=payload,
+            timeout=30.0,
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data["prompt_id"]
 
     async def get_history(self, prompt_id: str) -> dict[str, Any] | None:
         """
@@ -60,17 +129,16 @@ class ComfyClient:
         Returns:
             History data if available, None if not yet complete
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/history/{prompt_id}",
-                timeout=10.0,
-            )
-            response.raise_for_status()
-            data = response.json()
+        response = await self._client.get(
+            f"/history/{prompt_id}",
+            timeout=10.0,
+        )
+        response.raise_for_status()
+        data = response.json()
 
-            if prompt_id in data:
-                return data[prompt_id]
-            return None
+        if prompt_id in data:
+            return data[prompt_id]
+        return None
 
     async def wait_for_completion(
         self,
@@ -78,7 +146,12 @@ class ComfyClient:
         timeout: float = DEFAULT_TIMEOUT,
     ) -> dict[str, Any]:
         """
-        Poll until the prompt execution is complete.
+        Wait until the prompt execution is complete.
+
+        Sleeps until the WebSocket listener reports the prompt finished
+        (re-checking history every WS_RECHECK_INTERVAL as a safety net),
+        or polls history with a growing interval when no listener is running.
+        HTTP errors while checking history are retried with exponential backoff.
 
         Args:
             prompt_id: The prompt ID to wait for
@@ -93,31 +166,148 @@ class ComfyClient:
         """
         start_time = asyncio.get_event_loop().time()
 
-        while True:
-            elapsed = asyncio.get_event_loop().time() - start_time
-            if elapsed > timeout:
-                raise TimeoutError(
-                    f"Prompt {prompt_id} did not complete within {timeout}s"
-                )
+        event = asyncio.Event()
+        if await self._ensure_listener():
+            self._completion_events[prompt_id] = event
+
+        delay = POLL_MIN_INTERVAL
 
-            history = await self.get_history(prompt_id)
-
-            if history is not None:
-                # Check for errors
-                if "status" in history:
-                    status = history["status"]
-                    if status.get("status_str") == "error":
-                        messages = status.get("messages", [])
-                        error_msg = "; ".join(
-                            str(m) for m in messages if m
-                        ) or "Unknown error"
-                        raise RuntimeError(f"ComfyUI execution failed: {error_msg}")
-
-                # Check if outputs are available
-                if "outputs" in history and history["outputs"]:
+        try:
+            while True:
+                elapsed = asyncio.get_event_loop().time() - start_time
+                if elapsed > timeout:
+                    raise TimeoutError(
+                        f"Prompt {prompt_id} did not complete within {timeout}s"
+                    )
+
+                # Clear before checking so a completion racing the request still wakes us
+                event.clear()
+                try:
+                    history = await self._check_history(prompt_id)
+                except httpx.HTTPError as e:
+                    delay = min(delay * 2, POLL_ERROR_MAX_INTERVAL)
+                    logger.warning(
+                        "History check for %s failed, retrying in %.1fs: %s",
+                        prompt_id, delay, e,
+                    )
+                    await asyncio.sleep(min(delay, timeout - elapsed))
+                    continue
+
+                if history is not None:
                     return history
 
-            await asyncio.sleep(POLL_INTERVAL)
+                if self._listener_running():
+                    try:
+                        await asyncio.wait_for(
+                            event.wait(),
+                            timeout=min(WS_RECHECK_INTERVAL, timeout - elapsed),
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    # Also brings the delay back under the cap after an error streak
+                    delay = min(delay * POLL_BACKOFF, POLL_MAX_INTERVAL)
+                    await asyncio.sleep(min(delay, timeout - elapsed))
+        finally:
+            self._completion_events.pop(prompt_id, None)
+
+    async def _check_history(self, prompt_id: str) -> dict[str, Any] | None:
+        """
+        Fetch history and return it if the prompt has finished.
+
+        Raises:
+            RuntimeError: If the execution failed
+        """
+        history = await self.get_history(prompt_id)
+
+        if history is not None:
+            # Check for errors
+            if "status" in history:
+                status = history["status"]
+                if status.get("status_str") == "error":
+                    messages = status.get("messages", [])
+                    error_msg = "; ".join(
+                        str(m) for m in messages if m
+                    ) or "Unknown error"
+                    raise RuntimeError(f"ComfyUI execution failed: {error_msg}")
+
+            # Check if outputs are available
+            if "outputs" in history and history["outputs"]:
+                return history
+
+        return None
+
+    def _listener_running(self) -> bool:
+        """Whether the WebSocket listener task is alive."""
+        return self._ws_task is not None and not self._ws_task.done()
+
+    async def _ensure_listener(self) -> bool:
+        """
+        Start the WebSocket listener if it isn't running.
+
+        Returns:
+            True if completion messages will be pushed, False if callers must poll
+        """
+        async with self._ws_lock:
+            if self._listener_running():
+                return True
+
+            # Don't retry (and wait up to open_timeout) on every call while /ws is down
+            if (
+                self._ws_failed_at is not None
+                and time.monotonic() - self._ws_failed_at < WS_RETRY_COOLDOWN
+            ):
+                return False
+
+            ws_url = self.base_url.replace("http", "ws", 1)
+            try:
+                ws = await websockets.connect(
+                    f"{ws_url}/ws?clientId={self.client_id}",
+                    open_timeout=5,
+                    max_size=None,  # Preview frames can be large
+                )
+            except Exception as e:
+                self._ws_failed_at = time.monotonic()
+                logger.warning(
+                    "ComfyUI WebSocket unavailable, polling for %.0fs: %s",
+                    WS_RETRY_COOLDOWN, e,
+                )
+                return False
+
+            self._ws_failed_at = None
+            self._ws_task = asyncio.create_task(self._listen(ws))
+            return True
+
+    async def _listen(self, ws: Any) -> None:
+        """Read WebSocket messages and wake waiters whose prompt finished."""
+        try:
+            async for message in ws:
+                if not isinstance(message, str):
+                    continue  # Binary preview images
+
+                try:
+                    msg = json.loads(message)
+                except json.JSONDecodeError:
+                    continue
+
+                data = msg.get("data") or {}
+                msg_type = msg.get("type")
+                # "executing" with no node is the legacy end-of-prompt signal
+                if msg_type in _WS_TERMINAL_TYPES or (
+                    msg_type == "executing" and data.get("node") is None
+                ):
+                    event = self._completion_events.get(data.get("prompt_id"))
+                    if event is not None:
+                        event.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("ComfyUI WebSocket listener stopped: %s", e)
+        finally:
+            await ws.close()
+            # Wake everyone so they re-check history and fall back to polling
+            for event in self._completion_events.values():
+                event.set()
 
     async def get_image(
         self,
@@ -142,32 +332,90 @@ class ComfyClient:
             "type": folder_type,
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/view",
+        response = await self._client.get(
+            "/view",
+            params=params,
+            timeout=30.0,
+        )
+        response.raise_for_status()
+        return response.content
+
+    async def download_image_to(
+        self,
+        dest: Path,
+        filename: str,
+        subfolder: str = "",
+        folder_type: str = "output",
+    ) -> int:
+        """
+        Download a generated image from ComfyUI straight to a file.
+
+        Streams the response in chunks so the image never sits fully in memory;
+        file writes run in worker threads to keep the event loop free.
+        A partially written file is removed if the download fails.
+
+        Args:
+            dest: Local path to write the image to
+            filename: The image filename
+            subfolder: Optional subfolder
+            folder_type: Type of folder (output, input, temp)
+
+        Returns:
+            Number of bytes written
+        """
+        params = {
+            "filename": filename,
+            "subfolder": subfolder,
+            "type": folder_type,
+        }
+
+        written = 0
+        try:
+            async with self._client.stream(
+                "GET",
+                "/view",
                 params=params,
                 timeout=30.0,
-            )
-            response.raise_for_status()
-            return response.content
+            ) as response:
+                response.raise_for_status()
+                with await asyncio.to_thread(dest.open, "wb") as f:
+                    async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        await asyncio.to_thread(f.write, chunk)
+                        written += len(chunk)
+        except BaseException:
+            await asyncio.to_thread(dest.unlink, missing_ok=True)
+            raise
+
+        return written
 
     async def get_system_stats(self) -> dict[str, Any]:
         """Get ComfyUI system stats (useful for health check)."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/system_stats",
-                timeout=10.0,
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._client.get(
+            "/system_stats",
+            timeout=10.0,
+        )
+        response.raise_for_status()
+        return response.json()
 
     async def is_available(self) -> bool:
-        """Check if ComfyUI is available and responding."""
+        """
+        Check if ComfyUI is available and responding.
+
+        The result is reused for AVAILABILITY_TTL seconds so back-to-back
+        generations don't each pay an extra round trip.
+        """
+        now = time.monotonic()
+        if self._avail_cache is not None and now - self._avail_cache[0] < AVAILABILITY_TTL:
+            return self._avail_cache[1]
+
         try:
             await self.get_system_stats()
-            return True
+            available = True
         except Exception:
-            return False
+            available = False
+
+        self._avail_cache = (now, available)
+        return available
 
 
 def extract_image_info(history: dict[str, Any]) -> list[dict[str, str]]:
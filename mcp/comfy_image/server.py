@@ -7,6 +7,9 @@ Provides tools for generating images using ComfyUI workflows.
 from __future__ import annotations
 
 import argparse
+import asyncio
+import copy
+import functools
 import json
 import logging
 import os
@@ -17,27 +20,18 @@ from typing import Any, Literal
 
 from mcp.server.fastmcp import FastMCP, Context
 from mcp.server.transport_security import TransportSecuritySettings
-from starlette.responses import FileResponse, Response
+from starlette.responses import Response
 
 try:
     from .comfy_client import ComfyClient, extract_image_info
     from .storage import ImageStorage
-    from shared.context import get_conversation_id
 except ImportError:
     # When running directly with mcp dev
     from comfy_client import ComfyClient, extract_image_info
     from storage import ImageStorage
 
-    def get_conversation_id(ctx: Context) -> str:
-        """Fallback for mcp dev mode."""
-        try:
-            if ctx.request_context and ctx.request_context.request:
-                raw_conv_id = ctx.request_context.request.headers.get("X-Conversation-ID")
-                if raw_conv_id:
-                    return "".join(c if c.isalnum() or c in "-_" else "_" for c in raw_conv_id[:64])
-        except Exception:
-            pass
-        return "_shared"
+from shared.context import get_conversation_id
+from shared.files import serve_conversation_file
 
 
 # Configure logging
@@ -64,6 +58,9 @@ WORKFLOWS_DIR = Path(__file__).parent / "workflows"
 # ComfyUI configuration
 COMFY_URL = os.getenv("COMFY_URL", "http://localhost:8188")
 
+# Shared ComfyUI client, reused across tool calls for connection pooling
+comfy_client = ComfyClient(base_url=COMFY_URL)
+
 
 def get_base_url() -> str | None:
     """Get the base URL for file serving."""
@@ -79,14 +76,20 @@ def get_file_url(conv_id: str, filename: str) -> str:
     return f"file://{DATA_DIR / conv_id / filename}"
 
 
-def load_workflow(name: str) -> dict[str, Any]:
-    """Load a workflow JSON file."""
+@functools.lru_cache(maxsize=8)
+def _load_workflow_template(name: str) -> dict[str, Any]:
+    """Read and parse a workflow JSON file once; callers must not mutate it."""
     workflow_path = WORKFLOWS_DIR / f"{name}.json"
     if not workflow_path.exists():
         raise FileNotFoundError(f"Workflow not found: {name}")
     return json.loads(workflow_path.read_text())
 
 
+def load_workflow(name: str) -> dict[str, Any]:
+    """Load a workflow, returning a fresh copy that is safe to modify."""
+    return copy.deepcopy(_load_workflow_template(name))
+
+
 def prepare_workflow(
     workflow: dict[str, Any],
     prompt: str,
@@ -121,6 +124,45 @@ def prepare_workflow(
     return workflow
 
 
+async def download_images(
+    storage: ImageStorage,
+    images: list[dict[str, str]],
+    prompt: str,
+    seed: int,
+) -> list[Path]:
+    """
+    Download all generated images concurrently into storage.
+
+    Downloads share the pooled ComfyUI client. If any download fails, the
+    others are cancelled, files already written are removed, and the first
+    error is re-raised.
+
+    Returns:
+        Local image paths, in the same order as images
+    """
+    image_paths = [
+        storage.reserve_path(prompt, seed, index=i) for i in range(len(images))
+    ]
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for image_path, img_info in zip(image_paths, images):
+                tg.create_task(
+                    comfy_client.download_image_to(
+                        image_path,
+                        filename=img_info["filename"],
+                        subfolder=img_info["subfolder"],
+                        folder_type=img_info["type"],
+                    )
+                )
+    except BaseExceptionGroup as eg:
+        for image_path in image_paths:
+            await asyncio.to_thread(image_path.unlink, missing_ok=True)
+        raise eg.exceptions[0] from None
+
+    return image_paths
+
+
 # Initialize MCP server
 # Disable DNS rebinding protection for Docker compatibility (allows Host: mcp-comfy:3002)
 mcp = FastMCP(
@@ -146,25 +188,7 @@ async def health_check(request) -> Response:
 @mcp.custom_route("/files/{conv_id}/{filename}", methods=["GET"])
 async def serve_file(request) -> Response:
     """Serve generated image files."""
-    conv_id = request.path_params.get("conv_id", "_shared")
-    filename = request.path_params.get("filename", "")
-
-    # Sanitize inputs to prevent path traversal
-    safe_conv_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in conv_id[:64])
-    safe_filename = Path(filename).name  # Remove any path components
-
-    file_path = DATA_DIR / safe_conv_id / safe_filename
-
-    if not file_path.exists():
-        return Response(content="File not found", status_code=404)
-
-    # Verify file is within DATA_DIR (security check)
-    try:
-        file_path.resolve().relative_to(DATA_DIR.resolve())
-    except ValueError:
-        return Response(content="Access denied", status_code=403)
-
-    return FileResponse(file_path)
+    return await serve_conversation_file(request, DATA_DIR)
 
 
 # Type aliases
@@ -211,6 +235,7 @@ async def generate_image(
         - success: Whether generation succeeded
         - image_path: Absolute path to the saved image
         - image_url: URL for markdown display (HTTP if available, file:// otherwise)
+        - images: Path and URL of every output image (the first is image_path/image_url)
         - prompt: The prompt used
         - metadata: Generation parameters (seed, dimensions, steps)
 
@@ -221,10 +246,9 @@ async def generate_image(
     """
     conv_id = get_conversation_id(ctx)
     storage = ImageStorage(conv_id=conv_id)
-    client = ComfyClient(base_url=COMFY_URL)
 
     # Check ComfyUI availability
-    if not await client.is_available():
+    if not await comfy_client.is_available():
         return {
             "success": False,
             "error": f"ComfyUI is not available at {COMFY_URL}. Make sure it's running.",
@@ -250,12 +274,12 @@ async def generate_image(
         )
 
         logger.info("Submitting workflow to ComfyUI...")
-        prompt_id = await client.queue_prompt(workflow)
+        prompt_id = await comfy_client.queue_prompt(workflow)
         logger.info("Prompt ID: %s", prompt_id)
 
         # Wait for completion
         logger.info("Waiting for generation to complete...")
-        history = await client.wait_for_completion(prompt_id)
+        history = await comfy_client.wait_for_completion(prompt_id)
 
         # Extract image info
         images = extract_image_info(history)
@@ -265,33 +289,39 @@ async def generate_image(
                 "error": "No images were generated",
             }
 
-        # Download and save the first image
-        img_info = images[0]
-        image_bytes = await client.get_image(
-            filename=img_info["filename"],
-            subfolder=img_info["subfolder"],
-            folder_type=img_info["type"],
-        )
-
-        # Save locally
-        image_path, metadata = storage.save_image(
-            image_bytes=image_bytes,
-            prompt=prompt,
-            seed=actual_seed,
-            width=width,
-            height=height,
-            steps=steps,
-            model="z_image_turbo",
-            comfy_filename=img_info["filename"],
-        )
-
-        # Generate URL (HTTP if available, file:// otherwise)
-        image_url = get_file_url(conv_id, image_path.name)
+        # Stream every output image straight to its local path
+        image_paths = await download_images(storage, images, prompt, actual_seed)
+
+        # Save metadata alongside each image (off the event loop)
+        saved_metadata = [
+            await asyncio.to_thread(
+                storage.write_metadata,
+                image_path=image_path,
+                prompt=prompt,
+                seed=actual_seed,
+                width=width,
+                height=height,
+                steps=steps,
+                model="z_image_turbo",
+                comfy_filename=img_info["filename"],
+            )
+            for image_path, img_info in zip(image_paths, images)
+        ]
+
+        # Generate URLs (HTTP if available, file:// otherwise)
+        saved_images = [
+            {
+                "image_path": str(image_path),
+                "image_url": get_file_url(conv_id, image_path.name),
+            }
+            for image_path in image_paths
+        ]
 
         return {
             "success": True,
-            "image_path": str(image_path),
-            "image_url": image_url,
+            "image_path": saved_images[0]["image_path"],
+            "image_url": saved_images[0]["image_url"],
+            "images": saved_images,
             "prompt": prompt,
             "metadata": {
                 "seed": actual_seed,
@@ -301,7 +331,7 @@ async def generate_image(
                 "aspect_ratio": aspect_ratio,
                 "quality": quality,
                 "model": "z_image_turbo",
-                "created_at": metadata.created_at,
+                "created_at": saved_metadata[0].created_at,
             },
         }
 
@@ -346,7 +376,7 @@ async def list_generated_images(ctx: Context, limit: int = 20) -> dict[str, Any]
     storage = ImageStorage(conv_id=conv_id)
 
     try:
-        images = storage.list_images(limit=limit)
+        images = await asyncio.to_thread(storage.list_images, limit=limit)
 
         return {
             "success": True,
@@ -385,10 +415,8 @@ async def check_comfy_status() -> dict[str, Any]:
         - url: The ComfyUI URL being used
         - stats: System stats if available
     """
-    client = ComfyClient(base_url=COMFY_URL)
-
     try:
-        stats = await client.get_system_stats()
+        stats = await comfy_client.get_system_stats()
         return {
             "available": True,
             "url": COMFY_URL,
@@ -1,7 +1,8 @@
 """
 Local storage management for generated images.
 
-Stores images with metadata in a structured directory.
+Stores images with metadata in a structured directory, plus a SQLite
+index of that metadata for fast listing.
 """
 
 from __future__ import annotations
@@ -9,13 +10,36 @@ from __future__ import annotations
 import hashlib
 import json
 import os
+import sqlite3
+import threading
+import time
 from dataclasses import asdict, dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 
+try:
+    import orjson
+except ImportError:
+    # Optional: stdlib json is used when orjson isn't installed
+    orjson = None
 
-@dataclass
+
+def _dump_json(data: dict[str, Any]) -> bytes:
+    """Serialize metadata to indented JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode()
+
+
+def _load_json(raw: bytes) -> Any:
+    """Parse JSON bytes (orjson's decode error subclasses json.JSONDecodeError)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+@dataclass(slots=True)
 class ImageMetadata:
     """Metadata for a generated image."""
 
@@ -41,13 +65,64 @@ class ImageMetadata:
 
 DEFAULT_CONV_ID = "_shared"
 
+INDEX_DB_NAME = "index.db"
+
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    local_path TEXT PRIMARY KEY,
+    conv_id TEXT NOT NULL,
+    prompt TEXT,
+    seed INTEGER,
+    width INTEGER,
+    height INTEGER,
+    steps INTEGER,
+    model TEXT,
+    created_at TEXT,
+    comfy_filename TEXT,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS ix_images_conv_mtime ON images (conv_id, mtime DESC);
+CREATE TABLE IF NOT EXISTS indexed_conversations (conv_id TEXT PRIMARY KEY);
+"""
+
+# ImageMetadata fields, in the order they are stored in the index
+_METADATA_COLUMNS = (
+    "local_path",
+    "prompt",
+    "seed",
+    "width",
+    "height",
+    "steps",
+    "model",
+    "created_at",
+    "comfy_filename",
+)
+
+# One connection per index database, shared by all ImageStorage instances
+_index_connections: dict[Path, sqlite3.Connection] = {}
+_index_lock = threading.RLock()
+
+
+def _open_index(db_path: Path) -> sqlite3.Connection:
+    """Get the shared index connection, creating the database on first use."""
+    conn = _index_connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_INDEX_SCHEMA)
+        _index_connections[db_path] = conn
+    return conn
+
 
 class ImageStorage:
     """
     Manager for locally stored generated images.
 
     Stores images in a configurable directory with associated metadata.
-    Images are organized in subdirectories by conversation ID.
+    Images are organized in subdirectories by conversation ID. Each image
+    has a JSON metadata file next to it, mirrored into a SQLite index
+    (index.db in the base directory) that list_images() queries.
     """
 
     def __init__(self, base_dir: Optional[Path] = None, conv_id: str = DEFAULT_CONV_ID):
@@ -56,6 +131,7 @@ class ImageStorage:
         ).resolve()
         self.conv_id = conv_id
         self.conv_dir = self.base_dir / conv_id
+        self.index_path = self.base_dir / INDEX_DB_NAME
         self._ensure_dirs()
 
     def _ensure_dirs(self) -> None:
@@ -64,14 +140,34 @@ class ImageStorage:
 
     @staticmethod
     def _prompt_hash(prompt: str) -> str:
-        """Generate a short hash from the prompt."""
-        return hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        """Generate a short (8 hex chars) hash from the prompt."""
+        # Only used to tag filenames, so a 4-byte BLAKE2 digest is enough
+        return hashlib.blake2b(prompt.encode(), digest_size=4).hexdigest()
 
-    def _generate_filename(self, prompt: str, seed: int) -> str:
+    def _generate_filename(self, prompt: str, seed: int, index: int = 0) -> str:
         """Generate a unique filename for an image."""
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+        timestamp = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
         prompt_hash = self._prompt_hash(prompt)
-        return f"{timestamp}_{prompt_hash}_{seed}.png"
+        # Later images from the same batch get an index suffix
+        suffix = f"_{index}" if index else ""
+        return f"{timestamp}_{prompt_hash}_{seed}{suffix}.png"
+
+    def reserve_path(self, prompt: str, seed: int, index: int = 0) -> Path:
+        """
+        Choose the path for a new image without writing anything.
+
+        Lets callers stream the image straight to its final location,
+        then record it with write_metadata().
+
+        Args:
+            prompt: The prompt used for generation
+            seed: The seed used
+            index: Position of the image within its batch
+
+        Returns:
+            Path where the image should be written
+        """
+        return self.conv_dir / self._generate_filename(prompt, seed, index)
 
     def save_image(
         self,
@@ -100,14 +196,53 @@ class ImageStorage:
         Returns:
             Tuple of (image_path, metadata)
         """
-        filename = self._generate_filename(prompt, seed)
-        image_path = self.conv_dir / filename
-        metadata_path = self.conv_dir / f"{filename}.json"
+        image_path = self.reserve_path(prompt, seed)
 
         # Save image
         image_path.write_bytes(image_bytes)
 
-        # Create and save metadata
+        metadata = self.write_metadata(
+            image_path=image_path,
+            prompt=prompt,
+            seed=seed,
+            width=width,
+            height=height,
+            steps=steps,
+            model=model,
+            comfy_filename=comfy_filename,
+        )
+
+        return image_path, metadata
+
+    def write_metadata(
+        self,
+        image_path: Path,
+        prompt: str,
+        seed: int,
+        width: int,
+        height: int,
+        steps: int,
+        model: str,
+        comfy_filename: Optional[str] = None,
+    ) -> ImageMetadata:
+        """
+        Write the metadata sidecar for an image already on disk.
+
+        Args:
+            image_path: Path of the saved image (see reserve_path())
+            prompt: The prompt used for generation
+            seed: The seed used
+            width: Image width
+            height: Image height
+            steps: Number of inference steps
+            model: Model name used
+            comfy_filename: Original filename from ComfyUI
+
+        Returns:
+            The written ImageMetadata
+        """
+        metadata_path = image_path.with_name(f"{image_path.name}.json")
+
         metadata = ImageMetadata(
             local_path=str(image_path),
             prompt=prompt,
@@ -119,9 +254,59 @@ class ImageStorage:
             comfy_filename=comfy_filename,
         )
 
-        metadata_path.write_text(json.dumps(metadata.to_dict(), indent=2))
+        metadata_path.write_bytes(_dump_json(metadata.to_dict()))
 
-        return image_path, metadata
+        with _index_lock:
+            conn = _open_index(self.index_path)
+            self._index_image(conn, metadata, time.time())
+
+        return metadata
+
+    def _index_image(
+        self,
+        conn: sqlite3.Connection,
+        metadata: ImageMetadata,
+        mtime: float,
+    ) -> None:
+        """Insert or update an image's row in the index."""
+        conn.execute(
+            f"INSERT OR REPLACE INTO images (conv_id, mtime, {', '.join(_METADATA_COLUMNS)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(_METADATA_COLUMNS))})",
+            (self.conv_id, mtime, *(getattr(metadata, col) for col in _METADATA_COLUMNS)),
+        )
+
+    def _ensure_indexed(self, conn: sqlite3.Connection) -> None:
+        """Import this conversation's existing JSON metadata files on first use."""
+        if conn.execute(
+            "SELECT 1 FROM indexed_conversations WHERE conv_id = ?",
+            (self.conv_id,),
+        ).fetchone():
+            return
+
+        conn.execute("BEGIN")
+        try:
+            # One scandir pass; DirEntry avoids building a Path per file
+            with os.scandir(self.conv_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json") or not entry.is_file():
+                        continue
+                    try:
+                        with open(entry.path, "rb") as f:
+                            data = _load_json(f.read())
+                        metadata = ImageMetadata.from_dict(data)
+                    except (json.JSONDecodeError, TypeError, KeyError):
+                        # Skip invalid metadata files
+                        continue
+                    self._index_image(conn, metadata, entry.stat().st_mtime)
+
+            conn.execute(
+                "INSERT INTO indexed_conversations (conv_id) VALUES (?)",
+                (self.conv_id,),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
 
     def list_images(self, limit: int = 20) -> list[ImageMetadata]:
         """
@@ -133,26 +318,23 @@ class ImageStorage:
         Returns:
             List of ImageMetadata, sorted by creation time (newest first)
         """
-        images = []
+        with _index_lock:
+            conn = _open_index(self.index_path)
+            self._ensure_indexed(conn)
+            rows = conn.execute(
+                f"SELECT {', '.join(_METADATA_COLUMNS)} FROM images "
+                "WHERE conv_id = ? ORDER BY mtime DESC LIMIT ?",
+                (self.conv_id, limit),
+            ).fetchall()
 
-        # Find all .json metadata files in conversation directory
-        metadata_files = sorted(
-            self.conv_dir.glob("*.json"),
-            key=lambda p: p.stat().st_mtime,
-            reverse=True,
-        )
+        images = []
 
-        for meta_path in metadata_files[:limit]:
-            try:
-                data = json.loads(meta_path.read_text())
-                metadata = ImageMetadata.from_dict(data)
+        for row in rows:
+            metadata = ImageMetadata.from_dict(dict(zip(_METADATA_COLUMNS, row)))
 
-                # Verify the image file still exists
-                if Path(metadata.local_path).exists():
-                    images.append(metadata)
-            except (json.JSONDecodeError, TypeError, KeyError):
-                # Skip invalid metadata files
-                continue
+            # Verify the image file still exists
+            if Path(metadata.local_path).exists():
+                images.append(metadata)
 
         return images
 
@@ -175,7 +357,7 @@ class ImageStorage:
             return None
 
         try:
-            data = json.loads(metadata_path.read_text())
+            data = _load_json(metadata_path.read_bytes())
             return ImageMetadata.from_dict(data)
         except (json.JSONDecodeError, TypeError, KeyError):
             return None
@@ -203,4 +385,8 @@ class ImageStorage:
             metadata_path.unlink()
             deleted = True
 
+        with _index_lock:
+            conn = _open_index(self.index_path)
+            conn.execute("DELETE FROM images WHERE local_path = ?", (str(image_path),))
+
         return deleted
@@ -2,17 +2,36 @@
 Markdown to PDF converter using Pandoc.
 
 Handles the conversion pipeline: Markdown → LaTeX → PDF
+
+By default Pandoc runs the LaTeX engine itself (--pdf-engine). With
+PDFGEN_PREAMBLE_FORMATS=1 and pdflatex, Pandoc stops at LaTeX and the
+document is compiled here instead: a preamble used more than once is
+dumped into a LaTeX format file (via the mylatexformat package) and reused
+by later compilations that share it, so package loading isn't repeated on
+every call. Each new format is checked against a compilation without it
+before it is used.
 """
 
 from __future__ import annotations
 
 import asyncio
+import atexit
+import contextlib
+import hashlib
+import logging
 import os
+import re
 import shutil
+import socket
+import stat
+import subprocess
 import tempfile
+import zlib
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
+
+import httpx
 
 try:
     from .styles import StyleConfig, get_style_config
@@ -24,6 +43,101 @@ except ImportError:
 
 PANDOC_PATH = os.getenv("PANDOC_PATH", "pandoc")
 LATEX_ENGINE = os.getenv("LATEX_ENGINE", "pdflatex")
+# Where dumped preamble formats are kept between runs
+FMT_CACHE_DIR = Path(os.getenv("PDFGEN_FMT_CACHE", "~/.cache/pdf_generator")).expanduser()
+FMT_CACHE_MAX_BYTES = int(os.getenv("PDFGEN_FMT_CACHE_MAX_MB", "256")) * 1024 * 1024
+# A preamble gets its own format once this many conversions have used it, so
+# one-off preambles (YAML title/author, header-includes) don't each pay a dump
+FMT_MIN_USES = 2
+# Finished PDFs keyed by their inputs (PDFGEN_CACHE="" disables the cache)
+_output_cache = os.getenv("PDFGEN_CACHE", "~/.cache/pdf_generator/output")
+OUTPUT_CACHE_DIR = Path(_output_cache).expanduser() if _output_cache else None
+OUTPUT_CACHE_MAX_BYTES = int(os.getenv("PDFGEN_CACHE_MAX_MB", "512")) * 1024 * 1024
+LATEX_MAX_RUNS = 3  # Same cap Pandoc uses for cross-reference reruns
+# LaTeX auxiliary files from earlier builds of the same source, so the first
+# pass already has the TOC, labels and outlines (and often is the only pass)
+AUX_CACHE_DIR = FMT_CACHE_DIR / "aux"
+AUX_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_AUX_SUFFIXES = (".aux", ".toc", ".out")
+# Opt-in: compile Pandoc's LaTeX here with dumped preamble formats instead of
+# letting Pandoc run the engine. Formats can't be dumped reliably for other
+# engines, so Pandoc always drives those itself.
+USE_PREAMBLE_FORMATS = (
+    os.getenv("PDFGEN_PREAMBLE_FORMATS", "").lower() in ("1", "true", "yes")
+    and Path(LATEX_ENGINE).name == "pdflatex"
+)
+
+# Minimum free space for using a RAM-backed scratch dir that wasn't set explicitly
+# (Docker's default /dev/shm is only 64 MB)
+FAST_TMP_MIN_FREE = 256 * 1024 * 1024
+PANDOC_SERVER_TIMEOUT = 120  # seconds Pandoc server may spend on one document
+
+# Remote images left as URLs in the LaTeX (the Pandoc server does no I/O);
+# pdflatex can't load those, so the CLI has to fetch them
+_REMOTE_GRAPHICS_RE = re.compile(
+    r"\\includegraphics\s*(?:\[[^\]]*\])?\s*\{\s*https?://", re.IGNORECASE
+)
+
+# Literal escape sequences in Markdown and their replacements:
+# \n -> newline, \t -> tab, \r -> nothing (normalize line endings)
+_ESCAPE_SEQUENCES = {"\\n": "\n", "\\t": "\t", "\\r": ""}
+_ESCAPE_SEQUENCE_RE = re.compile(r"\\[ntr]")
+
+# Log messages asking for another LaTeX pass (the same ones Pandoc looks for;
+# longtable's is "Table widths have changed. Rerun LaTeX.")
+_RERUN_MARKERS = ("Rerun to get", "Rerun LaTeX", "Label(s) may have changed")
+
+# Preamble hash -> dumped format (None if it couldn't be built or used),
+# and preamble hash -> conversions seen without a format; both LRU-bounded
+_FMT_CACHE: dict[str, Optional[Path]] = {}
+_fmt_uses: dict[str, int] = {}
+_FMT_MEMO_MAX_ENTRIES = 256
+# One lock per preamble being looked up or built, and how many tasks use it
+_fmt_locks: dict[str, asyncio.Lock] = {}
+_fmt_lock_users: dict[str, int] = {}
+
+# Stub body compiled with and without a new format to check it (see _format_matches)
+_FMT_CHECK_BODY = "\\begin{document}\n\\section{Format check}\nFormat check.\n\\end{document}\n"
+# PDF streams (object streams hold the Info and Outlines dicts when compressed)
+_PDF_STREAM_RE = re.compile(rb"stream\r?\n(.*?)endstream", re.S)
+# Document metadata and outline entries; dates and IDs differ on every run
+_PDF_META_RE = re.compile(
+    rb"/(?:Title|Author|Subject|Keywords|Creator|Producer|Trapped|PageMode|Lang|Count)"
+    rb"\s*(?:\((?:\\.|[^\\)])*\)|<[^>]*>|/\w+|\d+)",
+    re.S,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _fast_tmpdir() -> Optional[str]:
+    """
+    Pick a RAM-backed base directory for conversion scratch files.
+
+    LaTeX rewrites its .aux/.log files on every pass; keeping them on tmpfs
+    avoids the disk traffic. PDFGEN_TMPDIR takes precedence, then /dev/shm
+    and $XDG_RUNTIME_DIR if they have room.
+
+    Returns:
+        Directory path, or None for the system default
+    """
+    explicit = os.getenv("PDFGEN_TMPDIR")
+    if explicit:
+        return explicit
+
+    for candidate in ("/dev/shm", os.getenv("XDG_RUNTIME_DIR")):
+        if not candidate or not os.access(candidate, os.W_OK | os.X_OK):
+            continue
+        try:
+            if shutil.disk_usage(candidate).free >= FAST_TMP_MIN_FREE:
+                return candidate
+        except OSError:
+            continue
+    return None
+
+
+TMP_BASE = _fast_tmpdir()
+_texmf_var: Optional[str] = None  # See _texmf_var_dir()
 
 
 def preprocess_markdown(content: str) -> str:
@@ -39,14 +153,12 @@ def preprocess_markdown(content: str) -> str:
     Returns:
         Preprocessed markdown content
     """
-    # Convert literal \n to actual newlines
-    content = content.replace("\\n", "\n")
-    # Convert literal \t to actual tabs
-    content = content.replace("\\t", "\t")
-    # Convert literal \r to nothing (normalize line endings)
-    content = content.replace("\\r", "")
+    # Common case: no backslash at all, so nothing can match
+    if "\\" not in content:
+        return content
 
-    return content
+    # One pass over the content for all three sequences
+    return _ESCAPE_SEQUENCE_RE.sub(lambda m: _ESCAPE_SEQUENCES[m.group()], content)
 
 
 @dataclass
@@ -63,6 +175,84 @@ class ConversionConfig:
     font_size: str = "11pt"
 
 
+class PandocServer:
+    """
+    Long-running `pandoc server` process for Markdown → LaTeX conversion.
+
+    Saves a Pandoc cold start on every document. One process serves
+    concurrent requests. If it isn't running (or the Pandoc build has no
+    server mode), callers fall back to the CLI.
+    """
+
+    def __init__(self, pandoc_path: str = PANDOC_PATH):
+        self.pandoc_path = pandoc_path
+        self._proc: subprocess.Popen | None = None
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the server process is alive."""
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self) -> None:
+        """Launch the server on a free local port (no-op if already running)."""
+        if self.running:
+            return
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+
+        try:
+            self._proc = subprocess.Popen(
+                [
+                    self.pandoc_path,
+                    "server",
+                    f"--port={port}",
+                    f"--timeout={PANDOC_SERVER_TIMEOUT}",
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,  # stdout carries MCP messages under stdio
+            )
+        except OSError as e:
+            logger.warning("Could not start pandoc server, using the CLI: %s", e)
+            return
+
+        self._client = httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}",
+            timeout=PANDOC_SERVER_TIMEOUT + 10,
+        )
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Terminate the server process."""
+        if self.running:
+            self._proc.terminate()
+        self._proc = None
+
+    async def convert(self, options: dict[str, Any]) -> str:
+        """
+        Convert a document with the server.
+
+        Args:
+            options: Request body (text, from, to and Pandoc options)
+
+        Returns:
+            The converted document
+
+        Raises:
+            RuntimeError: If Pandoc reports a conversion error
+            httpx.HTTPError: If the server can't be reached
+        """
+        response = await self._client.post("/", json=options)
+        if response.status_code != 200:
+            raise RuntimeError(f"Pandoc conversion failed: {response.text}")
+        return response.text
+
+
+pandoc_server = PandocServer()
+
+
 async def check_pandoc_available() -> tuple[bool, Optional[str]]:
     """
     Check if Pandoc is available.
@@ -113,16 +303,24 @@ async def check_latex_available() -> tuple[bool, str]:
 async def convert_markdown_to_pdf(
     content: str,
     config: ConversionConfig,
-) -> bytes:
+    out_path: Path,
+    slots: Optional[asyncio.Semaphore] = None,
+) -> Path:
     """
     Convert Markdown content to PDF using Pandoc.
 
+    The PDF is moved from the scratch directory to out_path (a rename, or a
+    kernel-side copy across filesystems) rather than read into memory.
+
     Args:
         content: Markdown content
         config: Conversion configuration
+        out_path: Where to write the PDF
+        slots: Semaphore limiting concurrent conversions, held only while
+            Pandoc and LaTeX run (output cache hits don't wait for it)
 
     Returns:
-        PDF file bytes
+        out_path
 
     Raises:
         RuntimeError: If conversion fails
@@ -134,46 +332,75 @@ async def convert_markdown_to_pdf(
     # Get style configuration
     style = get_style_config(config.style)
 
+    # Header and cover page go to the Pandoc CLI as files, or to the
+    # Pandoc server as template variables
+    header_content = get_document_header(style=style, toc=config.toc)
+
+    cover_content = ""
+    if config.cover_page and config.title:
+        cover_content = get_cover_page_template(
+            title=config.title,
+            author=config.author,
+            doc_date=config.date,
+            style=style,
+        )
+
+    # Identical inputs give an identical PDF, so reuse a previous build.
+    # The key covers the generated header and cover page (which include
+    # the style and the resolved date) rather than the raw config.
+    cache_file = None
+    if OUTPUT_CACHE_DIR is not None:
+        key = hashlib.sha256("\0".join([
+            LATEX_ENGINE,
+            content,
+            header_content,
+            cover_content,
+            style.margin,
+            config.font_size,
+            config.paper_size,
+            str(config.toc),
+        ]).encode()).hexdigest()
+        cache_file = OUTPUT_CACHE_DIR / f"{key}.pdf"
+        if await asyncio.to_thread(_restore_cached_pdf, cache_file, out_path):
+            logger.debug("Reused cached PDF %s", cache_file.name)
+            return out_path
+
+    if slots is not None and slots.locked():
+        logger.debug("All conversion slots busy, waiting")
+    async with slots if slots is not None else contextlib.nullcontext():
+        await _build_pdf(content, config, style, header_content, cover_content, out_path)
+
+    if cache_file is not None:
+        await asyncio.to_thread(_store_cached_pdf, out_path, cache_file)
+
+    return out_path
+
+
+async def _build_pdf(
+    content: str,
+    config: ConversionConfig,
+    style: StyleConfig,
+    header_content: str,
+    cover_content: str,
+    out_path: Path,
+) -> None:
+    """Run Pandoc (and LaTeX) in a scratch directory and move the PDF to out_path."""
     # Create temporary directory for conversion
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with tempfile.TemporaryDirectory(dir=TMP_BASE) as tmpdir:
         tmppath = Path(tmpdir)
 
-        # Write markdown content
+        # Input files, written only if the CLI runs
         md_file = tmppath / "input.md"
-        md_file.write_text(content, encoding="utf-8")
-
-        # Create LaTeX header file
         header_file = tmppath / "header.tex"
-        header_content = get_document_header(
-            style=style,
-            paper_size=config.paper_size,
-            font_size=config.font_size,
-            toc=config.toc,
-        )
-        header_file.write_text(header_content, encoding="utf-8")
-
-        # Create cover page if requested
-        before_body_file = None
-        if config.cover_page and config.title:
-            before_body_file = tmppath / "cover.tex"
-            cover_content = get_cover_page_template(
-                title=config.title,
-                author=config.author,
-                doc_date=config.date,
-                style=style,
-            )
-            before_body_file.write_text(cover_content, encoding="utf-8")
-
-        # Output PDF file
-        pdf_file = tmppath / "output.pdf"
+        before_body_file = tmppath / "cover.tex" if cover_content else None
+        cli_inputs = {md_file: content, header_file: header_content}
+        if before_body_file:
+            cli_inputs[before_body_file] = cover_content
 
         # Build Pandoc command
         cmd = [
             PANDOC_PATH,
             str(md_file),
-            "-o",
-            str(pdf_file),
-            f"--pdf-engine={LATEX_ENGINE}",
             f"--include-in-header={header_file}",
             f"-V", f"geometry:margin={style.margin}",
             f"-V", f"fontsize={config.font_size}",
@@ -190,24 +417,502 @@ async def convert_markdown_to_pdf(
             cmd.append("--toc")
             cmd.extend(["--toc-depth", "3"])
 
-        # Run Pandoc
+        if not USE_PREAMBLE_FORMATS:
+            pdf_file = tmppath / "output.pdf"
+            cmd.extend(["-o", str(pdf_file), f"--pdf-engine={LATEX_ENGINE}"])
+            await _write_inputs(cli_inputs)
+            await _run_pandoc(cmd, env=_latex_env())
+        else:
+            # Have Pandoc stop at LaTeX (fetching linked images into the
+            # temp dir, as it does for PDF output) and compile it ourselves
+            tex_file = tmppath / "output.tex"
+            tex_content = None
+            if pandoc_server.running:
+                try:
+                    tex_content = await pandoc_server.convert({
+                        "text": content,
+                        "from": "markdown",
+                        "to": "latex",
+                        "standalone": True,
+                        # Same template variables the CLI flags above set
+                        "variables": {
+                            "header-includes": header_content,
+                            "include-before": cover_content,
+                            "geometry": f"margin={style.margin}",
+                            "fontsize": config.font_size,
+                            "papersize": config.paper_size,
+                        },
+                        "table-of-contents": config.toc,
+                        "toc-depth": 3,
+                    })
+                except httpx.HTTPError as e:
+                    logger.warning("Pandoc server unavailable, using the CLI: %s", e)
+
+                # Checked on the output so every image syntax (inline,
+                # reference-style, nested brackets in the alt text) is covered
+                if tex_content is not None and _REMOTE_GRAPHICS_RE.search(tex_content):
+                    logger.debug("Remote images in the document, using the CLI")
+                    tex_content = None
+
+            if tex_content is not None:
+                tex_file.write_text(tex_content, encoding="utf-8")
+            else:
+                cmd.extend(["-o", str(tex_file), f"--extract-media={tmppath / 'media'}"])
+                await _write_inputs(cli_inputs)
+                await _run_pandoc(cmd)
+            pdf_file = await _compile_tex(tex_file)
+
+        if not pdf_file.exists():
+            raise RuntimeError("PDF file was not created")
+
+        # shutil.move renames, or copies with sendfile when crossing filesystems
+        try:
+            await asyncio.to_thread(shutil.move, pdf_file, out_path)
+        except BaseException:
+            await asyncio.to_thread(out_path.unlink, missing_ok=True)
+            raise
+
+
+def _restore_cached_pdf(cache_file: Path, out_path: Path) -> bool:
+    """
+    Copy a cached PDF to out_path.
+
+    The cache never shares an inode with served PDFs (see _store_cached_pdf),
+    so touching cache entries for LRU order can't change the Last-Modified
+    or ETag of PDFs already handed out.
+
+    Returns:
+        True if the cached PDF was used, False on a cache miss
+    """
+    try:
+        try:
+            shutil.copyfile(cache_file, out_path)
+        except FileNotFoundError:
+            return False
+        # Mark as recently used for _prune_cache
+        os.utime(cache_file)
+    except OSError as e:
+        logger.warning("Could not reuse cached PDF %s: %s", cache_file, e)
+        out_path.unlink(missing_ok=True)
+        return False
+    return True
+
+
+def _store_cached_pdf(pdf_file: Path, cache_file: Path) -> None:
+    """Add a freshly built PDF to the output cache (best effort)."""
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # A copy rather than a hard link, so the served PDF's mtime stays put
+        shutil.copyfile(pdf_file, tmp_file)
+        # Atomic, so concurrent readers never see a partial file
+        os.replace(tmp_file, cache_file)
+        _prune_cache(cache_file.parent, OUTPUT_CACHE_MAX_BYTES, ".pdf")
+    except OSError as e:
+        logger.warning("Could not cache PDF %s: %s", cache_file, e)
+        tmp_file.unlink(missing_ok=True)
+
+
+def _prune_cache(cache_dir: Path, max_bytes: int, suffix: str = "") -> None:
+    """
+    Evict least recently used files until the cache directory fits max_bytes.
+
+    Only regular files ending in suffix count; subdirectories (the format
+    cache holds the others by default) are left alone.
+    """
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(suffix) and not entry.name.endswith(".tmp"):
+                st = entry.stat(follow_symlinks=False)
+                if stat.S_ISREG(st.st_mode):
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return
+
+    # Oldest (least recently used) first
+    entries.sort()
+    for _, size, path in entries:
+        Path(path).unlink(missing_ok=True)
+        total -= size
+        if total <= max_bytes:
+            break
+
+
+async def _write_inputs(files: dict[Path, str]) -> None:
+    """Write Pandoc CLI input files (UTF-8) concurrently in worker threads."""
+    await asyncio.gather(*(
+        asyncio.to_thread(path.write_text, text, encoding="utf-8")
+        for path, text in files.items()
+    ))
+
+
+async def _run_pandoc(cmd: list[str], env: Optional[dict[str, str]] = None) -> None:
+    """
+    Run a Pandoc command.
+
+    Args:
+        cmd: Command line
+        env: Environment (defaults to the server's)
+
+    Raises:
+        RuntimeError: If Pandoc exits with an error
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+    stdout, stderr = await proc.communicate()
+
+    if proc.returncode != 0:
+        error_msg = stderr.decode() if stderr else "Unknown error"
+        raise RuntimeError(f"Pandoc conversion failed: {error_msg}")
+
+
+async def _compile_tex(tex_file: Path) -> Path:
+    """
+    Compile a standalone LaTeX file.
+
+    Reuses a dumped preamble format and auxiliary files from earlier builds
+    of the same source where available.
+
+    Args:
+        tex_file: LaTeX file produced by Pandoc
+
+    Returns:
+        Path to the generated PDF
+
+    Raises:
+        RuntimeError: If compilation fails
+    """
+    tex = await asyncio.to_thread(tex_file.read_text, encoding="utf-8")
+    aux_key = hashlib.sha256(f"{LATEX_ENGINE}\n{tex}".encode()).hexdigest()
+    await asyncio.to_thread(_seed_aux_files, tex_file, aux_key)
+
+    pdf_file = await _compile_tex_with_format(tex_file, tex)
+
+    await asyncio.to_thread(_store_aux_files, tex_file, aux_key)
+    return pdf_file
+
+
+async def _compile_tex_with_format(tex_file: Path, tex: str) -> Path:
+    """Compile tex_file, starting from a dumped preamble format if possible."""
+    preamble, found, _ = tex.partition(r"\begin{document}")
+    if not found:
+        return await _run_latex(tex_file, None)
+
+    key = hashlib.sha256(f"{LATEX_ENGINE}\n{preamble}".encode()).hexdigest()[:16]
+    fmt_file = await _get_preamble_format(tex_file, key)
+
+    try:
+        return await _run_latex(tex_file, fmt_file)
+    except RuntimeError:
+        if fmt_file is None:
+            raise
+        # Raises again if the document itself is broken
+        pdf_file = await _run_latex(tex_file, None)
+
+    # Only the format was at fault (e.g. TeX was upgraded under it)
+    logger.warning("Discarding unusable LaTeX format %s", fmt_file)
+    _FMT_CACHE[key] = None
+    fmt_file.unlink(missing_ok=True)
+    return pdf_file
+
+
+def _seed_aux_files(tex_file: Path, key: str) -> None:
+    """Copy cached auxiliary files for this source next to tex_file."""
+    for suffix in _AUX_SUFFIXES:
+        cached = AUX_CACHE_DIR / f"{key}{suffix}"
+        try:
+            shutil.copyfile(cached, tex_file.with_suffix(suffix))
+            os.utime(cached)  # Recently used, for _prune_cache
+        except OSError:
+            continue
+
+
+def _store_aux_files(tex_file: Path, key: str) -> None:
+    """Cache the auxiliary files of a successful build (best effort)."""
+    try:
+        AUX_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        for suffix in _AUX_SUFFIXES:
+            aux_file = tex_file.with_suffix(suffix)
+            if not aux_file.exists():
+                continue
+            cached = AUX_CACHE_DIR / f"{key}{suffix}"
+            tmp_file = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+            shutil.copyfile(aux_file, tmp_file)
+            os.replace(tmp_file, cached)
+        _prune_cache(AUX_CACHE_DIR, AUX_CACHE_MAX_BYTES)
+    except OSError as e:
+        logger.warning("Could not cache LaTeX auxiliary files: %s", e)
+
+
+async def _get_preamble_format(tex_file: Path, key: str) -> Optional[Path]:
+    """
+    Get the dumped format for a preamble, building it once it is reused.
+
+    Args:
+        tex_file: LaTeX file whose preamble (up to \\begin{document}) is dumped
+        key: Hash identifying the preamble
+
+    Returns:
+        Path to the .fmt file, or None if no format is available
+    """
+    if key in _FMT_CACHE:
+        fmt_file = _FMT_CACHE[key]
+        if fmt_file is None or await asyncio.to_thread(_touch, fmt_file):
+            return fmt_file
+        # Evicted by _prune_cache since, so it counts as unused again
+        _FMT_CACHE.pop(key, None)
+
+    # Only conversions with this preamble wait while its format is built
+    lock = _fmt_locks.setdefault(key, asyncio.Lock())
+    _fmt_lock_users[key] = _fmt_lock_users.get(key, 0) + 1
+    try:
+        async with lock:
+            return await _find_or_build_format(tex_file, key)
+    finally:
+        _fmt_lock_users[key] -= 1
+        if not _fmt_lock_users[key]:
+            del _fmt_lock_users[key]
+            del _fmt_locks[key]
+
+
+async def _find_or_build_format(tex_file: Path, key: str) -> Optional[Path]:
+    """Look up a format on disk, or build it once the preamble has been used enough."""
+    if key in _FMT_CACHE:
+        # Built while we waited for the lock
+        return _FMT_CACHE[key]
+
+    fmt_file = FMT_CACHE_DIR / f"{key}.fmt"
+    if not await asyncio.to_thread(_touch, fmt_file):
+        uses = _fmt_uses.pop(key, 0) + 1
+        if uses < FMT_MIN_USES:
+            _remember(_fmt_uses, key, uses)
+            return None
+        fmt_file = await _build_format(tex_file, key)
+
+    _remember(_FMT_CACHE, key, fmt_file)
+    return fmt_file
+
+
+def _remember(memo: dict, key: str, value: Any) -> None:
+    """Insert into an in-memory format memo, dropping the least recently set entry."""
+    memo.pop(key, None)
+    memo[key] = value
+    if len(memo) > _FMT_MEMO_MAX_ENTRIES:
+        del memo[next(iter(memo))]
+
+
+def _touch(path: Path) -> bool:
+    """Mark a cached file as recently used; False if it doesn't exist."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+async def _build_format(tex_file: Path, key: str) -> Optional[Path]:
+    """Dump tex_file's preamble to FMT_CACHE_DIR/<key>.fmt."""
+    # Build under a unique job name and rename, so other processes never see a partial file
+    jobname = f"{key}-{os.getpid()}"
+    try:
+        FMT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
         proc = await asyncio.create_subprocess_exec(
-            *cmd,
+            LATEX_ENGINE,
+            "-ini",
+            "-interaction=nonstopmode",
+            "-halt-on-error",
+            f"-jobname={jobname}",
+            f"-output-directory={FMT_CACHE_DIR}",
+            f"&pdflatex mylatexformat.ltx {tex_file.name}",
+            cwd=tex_file.parent,
+            env=_latex_env(),
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
         )
+        stdout, _ = await proc.communicate()
+    except OSError as e:
+        logger.warning("Could not build LaTeX format, compiling without it: %s", e)
+        return None
+
+    (FMT_CACHE_DIR / f"{jobname}.log").unlink(missing_ok=True)
+    built = FMT_CACHE_DIR / f"{jobname}.fmt"
+    if proc.returncode != 0 or not built.exists():
+        logger.warning(
+            "Could not build LaTeX format, compiling without it: %s",
+            _latex_error(stdout),
+        )
+        built.unlink(missing_ok=True)
+        return None
+
+    if not await _format_matches(tex_file, built):
+        logger.warning("LaTeX format %s changes the PDF output, compiling without it", key)
+        built.unlink(missing_ok=True)
+        return None
+
+    fmt_file = FMT_CACHE_DIR / f"{key}.fmt"
+    built.replace(fmt_file)
+    logger.info("Built LaTeX format %s", fmt_file)
+    try:
+        await asyncio.to_thread(_prune_cache, FMT_CACHE_DIR, FMT_CACHE_MAX_BYTES, ".fmt")
+    except OSError as e:
+        logger.warning("Could not prune LaTeX formats: %s", e)
+    return fmt_file
+
+
+async def _format_matches(tex_file: Path, fmt_file: Path) -> bool:
+    """
+    Check a freshly dumped format against a compilation without it.
 
-        stdout, stderr = await proc.communicate()
+    Compiles a stub document with tex_file's preamble both ways and compares
+    the PDF metadata and outline entries (hyperref, bookmark), which are what
+    a dump can silently lose compared to Pandoc's own pdflatex pipeline.
+
+    Returns:
+        True if both PDFs carry the same metadata
+    """
+    check_file = tex_file.with_name("fmtcheck.tex")
+    try:
+        tex = await asyncio.to_thread(tex_file.read_text, encoding="utf-8")
+        preamble = tex.partition(r"\begin{document}")[0]
+        await asyncio.to_thread(
+            check_file.write_text, preamble + _FMT_CHECK_BODY, encoding="utf-8"
+        )
+        pdfs = await asyncio.gather(
+            _run_latex(check_file, fmt_file, jobname="fmtcheck-fmt"),
+            _run_latex(check_file, None),
+        )
+        with_fmt, without_fmt = await asyncio.gather(
+            *(asyncio.to_thread(pdf.read_bytes) for pdf in pdfs)
+        )
+    except (OSError, RuntimeError) as e:
+        logger.warning("Could not check LaTeX format: %s", e)
+        return False
+    return _pdf_metadata(with_fmt) == _pdf_metadata(without_fmt)
+
+
+def _pdf_metadata(pdf: bytes) -> list[bytes]:
+    """Sorted metadata and outline entries of a PDF, compressed streams included."""
+    chunks = [pdf]
+    for match in _PDF_STREAM_RE.finditer(pdf):
+        try:
+            chunks.append(zlib.decompressobj().decompress(match.group(1)))
+        except zlib.error:
+            continue  # Not Flate-compressed
+    return sorted(entry for chunk in chunks for entry in _PDF_META_RE.findall(chunk))
+
+
+async def _run_latex(
+    tex_file: Path,
+    fmt_file: Optional[Path],
+    jobname: Optional[str] = None,
+) -> Path:
+    """
+    Run the LaTeX engine until cross-references and the TOC settle.
+
+    Args:
+        tex_file: LaTeX file to compile
+        fmt_file: Dumped preamble format to start from, if any
+        jobname: Base name for the output files (defaults to tex_file's)
+
+    Returns:
+        Path to the generated PDF
+
+    Raises:
+        RuntimeError: If compilation fails
+    """
+    cmd = [LATEX_ENGINE, "-interaction=nonstopmode", "-halt-on-error"]
+    if fmt_file is not None:
+        cmd.append(f"-fmt={fmt_file.stem}")
+    if jobname is not None:
+        cmd.append(f"-jobname={jobname}")
+    cmd.append(tex_file.name)
+
+    output = tex_file.with_name(jobname) if jobname is not None else tex_file
+    toc_file = output.with_suffix(".toc")
+
+    for _ in range(LATEX_MAX_RUNS):
+        # LaTeX doesn't warn when the TOC changes, so compare it ourselves
+        toc_before = await asyncio.to_thread(_read_bytes_if_exists, toc_file)
+
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=tex_file.parent,
+            env=_latex_env(),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, _ = await proc.communicate()
 
         if proc.returncode != 0:
-            error_msg = stderr.decode() if stderr else "Unknown error"
-            raise RuntimeError(f"Pandoc conversion failed: {error_msg}")
+            raise RuntimeError(f"LaTeX compilation failed: {_latex_error(stdout)}")
 
-        # Read and return PDF bytes
-        if not pdf_file.exists():
-            raise RuntimeError("PDF file was not created")
+        log, toc_after = await asyncio.gather(
+            asyncio.to_thread(
+                output.with_suffix(".log").read_text, encoding="utf-8", errors="replace"
+            ),
+            asyncio.to_thread(_read_bytes_if_exists, toc_file),
+        )
+        if toc_after == toc_before and not any(m in log for m in _RERUN_MARKERS):
+            break
+
+    return output.with_suffix(".pdf")
+
+
+def _read_bytes_if_exists(path: Path) -> Optional[bytes]:
+    """Read a file's bytes, or None if it doesn't exist."""
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _latex_env() -> dict[str, str]:
+    """Environment for LaTeX runs in the temp dir."""
+    env = {
+        **os.environ,
+        # Keep relative image paths working from the server's cwd, as with Pandoc;
+        # the trailing separator keeps the default search paths
+        "TEXINPUTS": f"{Path.cwd()}{os.pathsep}",
+        "TEXFORMATS": f"{FMT_CACHE_DIR}{os.pathsep}",
+    }
+    if TMP_BASE is not None:
+        # Generated fonts and caches go to RAM too, shared between conversions
+        texmf_var = _texmf_var_dir()
+        env["TEXMFVAR"] = texmf_var
+        env["TEXMFCACHE"] = texmf_var
+    return env
+
+
+def _texmf_var_dir() -> str:
+    """
+    Private TEXMFVAR directory under TMP_BASE, created on first use.
 
-        return pdf_file.read_bytes()
+    mkdtemp gives it an unpredictable name and mode 0700, so other local
+    users can't plant files there for kpathsea to pick up (TMP_BASE is
+    usually the world-writable /dev/shm).
+    """
+    global _texmf_var
+    if _texmf_var is None:
+        _texmf_var = tempfile.mkdtemp(prefix="pdf_generator-texmf-var-", dir=TMP_BASE)
+        atexit.register(shutil.rmtree, _texmf_var, ignore_errors=True)
+    return _texmf_var
+
+
+def _latex_error(output: bytes) -> str:
+    """Extract the first error (lines starting with "!") from LaTeX output."""
+    lines = output.decode(errors="replace").splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith("!"):
+            return "\n".join(lines[i:i + 4])
+    return "\n".join(lines[-10:]) or "Unknown error"
 
 
 def get_pandoc_path() -> str:
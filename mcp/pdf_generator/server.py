@@ -7,6 +7,7 @@ Provides tools for generating PDFs from Markdown using Pandoc and LaTeX.
 from __future__ import annotations
 
 import argparse
+import asyncio
 import logging
 import os
 import sys
@@ -15,7 +16,7 @@ from typing import Literal
 
 from mcp.server.fastmcp import FastMCP, Context
 from mcp.server.transport_security import TransportSecuritySettings
-from starlette.responses import FileResponse, Response
+from starlette.responses import Response
 
 try:
     from .converter import (
@@ -25,10 +26,11 @@ try:
         check_latex_available,
         get_pandoc_path,
         get_latex_engine,
+        pandoc_server,
+        USE_PREAMBLE_FORMATS,
     )
     from .storage import PDFStorage
     from .styles import StyleType, get_style_info
-    from shared.context import get_conversation_id
 except ImportError:
     # When running directly with mcp dev
     from converter import (
@@ -38,20 +40,14 @@ except ImportError:
         check_latex_available,
         get_pandoc_path,
         get_latex_engine,
+        pandoc_server,
+        USE_PREAMBLE_FORMATS,
     )
     from storage import PDFStorage
     from styles import StyleType, get_style_info
 
-    def get_conversation_id(ctx: Context) -> str:
-        """Fallback for mcp dev mode."""
-        try:
-            if ctx.request_context and ctx.request_context.request:
-                raw_conv_id = ctx.request_context.request.headers.get("X-Conversation-ID")
-                if raw_conv_id:
-                    return "".join(c if c.isalnum() or c in "-_" else "_" for c in raw_conv_id[:64])
-        except Exception:
-            pass
-        return "_shared"
+from shared.context import get_conversation_id
+from shared.files import serve_conversation_file
 
 
 # Configure logging
@@ -67,17 +63,59 @@ _server_config = {
     "host": "127.0.0.1",
     "port": 8000,
     "base_url": None,  # Set when server starts with HTTP transport
+    "dependencies": None,  # Cached (pandoc, latex) check results once both pass
 }
 
 # Data directory for generated PDFs
 DATA_DIR = Path(os.getenv("PDFS_DIR", "./data/generated_pdfs")).resolve()
 
+# Pandoc/LaTeX runs are CPU-bound; cap them so concurrent requests queue
+# instead of oversubscribing the CPU
+_max_concurrency = int(os.getenv("PDFGEN_MAX_CONCURRENCY", os.cpu_count() or 2))
+# 0 would make every conversion wait forever, and a negative value can't make a semaphore
+MAX_CONCURRENCY = max(1, _max_concurrency)
+if MAX_CONCURRENCY != _max_concurrency:
+    logger.warning(
+        "PDFGEN_MAX_CONCURRENCY=%d is below 1, using %d", _max_concurrency, MAX_CONCURRENCY
+    )
+_conversion_slots = asyncio.Semaphore(MAX_CONCURRENCY)
+
 
 def get_base_url() -> str | None:
     """Get the base URL for file serving."""
     return _server_config.get("base_url")
 
 
+async def check_dependencies(
+    refresh: bool = False,
+) -> tuple[tuple[bool, str | None], tuple[bool, str]]:
+    """
+    Check Pandoc and LaTeX availability.
+
+    Results are cached once both are available, so tool calls don't spawn
+    probe processes every time.
+
+    Args:
+        refresh: Ignore the cached result and probe again
+
+    Returns:
+        Tuple of (check_pandoc_available(), check_latex_available()) results
+    """
+    cached = _server_config.get("dependencies")
+    if cached is not None and not refresh:
+        return cached
+
+    # Independent subprocess probes, so run them concurrently
+    pandoc, latex = await asyncio.gather(
+        check_pandoc_available(),
+        check_latex_available(),
+    )
+
+    if pandoc[0] and latex[0]:
+        _server_config["dependencies"] = (pandoc, latex)
+    return pandoc, latex
+
+
 def get_file_url(conv_id: str, filename: str) -> str:
     """Generate URL for a file."""
     base_url = get_base_url()
@@ -112,25 +150,8 @@ async def health_check(request) -> Response:
 @mcp.custom_route("/files/{conv_id}/{filename}", methods=["GET"])
 async def serve_file(request) -> Response:
     """Serve generated PDF files."""
-    conv_id = request.path_params.get("conv_id", "_shared")
-    filename = request.path_params.get("filename", "")
-
-    # Sanitize inputs to prevent path traversal
-    safe_conv_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in conv_id[:64])
-    safe_filename = Path(filename).name  # Remove any path components
+    return await serve_conversation_file(request, DATA_DIR)
 
-    file_path = DATA_DIR / safe_conv_id / safe_filename
-
-    if not file_path.exists():
-        return Response(content="File not found", status_code=404)
-
-    # Verify file is within DATA_DIR (security check)
-    try:
-        file_path.resolve().relative_to(DATA_DIR.resolve())
-    except ValueError:
-        return Response(content="Access denied", status_code=403)
-
-    return FileResponse(file_path)
 
 # Type aliases
 PaperSizeType = Literal["a4", "letter", "legal"]
@@ -210,8 +231,9 @@ async def generate_pdf(
             "error": f"Invalid font_size: {font_size}. Valid sizes: {valid_font_sizes}",
         }
 
+    (pandoc_ok, _), (latex_ok, _) = await check_dependencies()
+
     # Check Pandoc availability
-    pandoc_ok, _ = await check_pandoc_available()
     if not pandoc_ok:
         return {
             "success": False,
@@ -219,7 +241,6 @@ async def generate_pdf(
         }
 
     # Check LaTeX availability
-    latex_ok, _ = await check_latex_available()
     if not latex_ok:
         return {
             "success": False,
@@ -239,13 +260,16 @@ async def generate_pdf(
             font_size=font_size,
         )
 
-        # Convert to PDF
-        pdf_bytes = await convert_markdown_to_pdf(content, config)
+        # Convert straight into the conversation directory
+        pdf_path = storage.reserve_pdf_path(title or "Untitled")
+        await convert_markdown_to_pdf(content, config, pdf_path, slots=_conversion_slots)
 
-        # Save PDF
-        pdf_path, pdf_metadata = storage.save_pdf(
-            pdf_bytes=pdf_bytes,
-            content=content,
+        # Save metadata (hashing and file writes in worker threads)
+        content_hash = await asyncio.to_thread(storage.hash_content, content)
+        pdf_metadata = await asyncio.to_thread(
+            storage.record_pdf_metadata,
+            pdf_path=pdf_path,
+            content_hash=content_hash,
             title=title or "Untitled",
             author=author,
             style=style,
@@ -305,7 +329,7 @@ async def list_generated_pdfs(ctx: Context, limit: int = 20) -> dict:
     storage = PDFStorage(conv_id=conv_id)
 
     try:
-        pdfs = storage.list_pdfs(limit=limit)
+        pdfs = await asyncio.to_thread(storage.list_pdfs, limit=limit)
 
         return {
             "success": True,
@@ -350,10 +374,13 @@ async def list_styles() -> dict:
 
 
 @mcp.tool()
-async def check_pandoc_status() -> dict:
+async def check_pandoc_status(refresh: bool = False) -> dict:
     """
     Check if Pandoc and LaTeX are available for PDF generation.
 
+    Args:
+        refresh: Probe again instead of reusing the last successful check
+
     Returns:
         Dictionary with:
         - available: Whether PDF generation is possible
@@ -362,8 +389,7 @@ async def check_pandoc_status() -> dict:
         - latex_available: Whether LaTeX is installed
         - latex_engine: LaTeX engine being used
     """
-    pandoc_ok, pandoc_version = await check_pandoc_available()
-    latex_ok, latex_engine = await check_latex_available()
+    (pandoc_ok, pandoc_version), (latex_ok, latex_engine) = await check_dependencies(refresh)
 
     result = {
         "available": pandoc_ok and latex_ok,
@@ -414,6 +440,13 @@ def main():
     logger.info("Pandoc path: %s", get_pandoc_path())
     logger.info("LaTeX engine: %s", get_latex_engine())
     logger.info("Data directory: %s", DATA_DIR)
+    logger.info("Max concurrent conversions: %d", MAX_CONCURRENCY)
+    logger.info("Preamble formats: %s", "on" if USE_PREAMBLE_FORMATS else "off")
+
+    # Keep a warm Pandoc for Markdown → LaTeX (falls back to the CLI if unavailable);
+    # only the preamble format pipeline stops at LaTeX
+    if USE_PREAMBLE_FORMATS:
+        pandoc_server.start()
 
     if args.transport in ["sse", "streamable-http"]:
         mcp.settings.port = args.port
@@ -1,7 +1,8 @@
 """
 Local storage management for generated PDFs.
 
-Stores PDF files with metadata in a structured directory.
+Stores PDF files with metadata in a structured directory, plus a SQLite
+index of that metadata for fast listing.
 """
 
 from __future__ import annotations
@@ -9,10 +10,35 @@ from __future__ import annotations
 import hashlib
 import json
 import os
+import secrets
+import sqlite3
+import threading
 from dataclasses import asdict, dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    # Optional: stdlib json is used when orjson isn't installed
+    orjson = None
+
+from shared.context import SafeCharTable
+
+
+def _dump_json(data: dict[str, Any]) -> bytes:
+    """Serialize metadata to indented JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode()
+
+
+def _load_json(raw: bytes) -> Any:
+    """Parse JSON bytes (orjson's decode error subclasses json.JSONDecodeError)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
 
 
 @dataclass
@@ -40,15 +66,71 @@ class PDFMetadata:
         return cls(**data)
 
 
+# Filename slug sanitizer for titles
+_TITLE_CHARS = SafeCharTable(keep="")
+
+
 DEFAULT_CONV_ID = "_shared"
 
+INDEX_DB_NAME = "index.db"
+
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pdfs (
+    local_path TEXT PRIMARY KEY,
+    conv_id TEXT NOT NULL,
+    title TEXT,
+    author TEXT,
+    style TEXT,
+    paper_size TEXT,
+    font_size TEXT,
+    has_cover_page INTEGER,
+    has_toc INTEGER,
+    content_hash TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_pdfs_conv_created ON pdfs (conv_id, created_at DESC);
+CREATE TABLE IF NOT EXISTS indexed_conversations (conv_id TEXT PRIMARY KEY);
+"""
+
+# PDFMetadata fields, in the order they are stored in the index
+_METADATA_COLUMNS = (
+    "local_path",
+    "title",
+    "author",
+    "style",
+    "paper_size",
+    "font_size",
+    "has_cover_page",
+    "has_toc",
+    "content_hash",
+    "created_at",
+)
+
+# One connection per index database, shared by all PDFStorage instances
+_index_connections: dict[Path, sqlite3.Connection] = {}
+_index_lock = threading.RLock()
+
+
+def _open_index(db_path: Path) -> sqlite3.Connection:
+    """Get the shared index connection, creating the database on first use."""
+    conn = _index_connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_INDEX_SCHEMA)
+        _index_connections[db_path] = conn
+    return conn
+
 
 class PDFStorage:
     """
     Manager for locally stored generated PDFs.
 
     Stores PDF files in a configurable directory with associated metadata.
-    PDFs are organized in subdirectories by conversation ID.
+    PDFs are organized in subdirectories by conversation ID. Each PDF has a
+    JSON metadata file next to it, mirrored into a SQLite index (index.db in
+    the base directory) that list_pdfs() queries.
     """
 
     def __init__(self, base_dir: Optional[Path] = None, conv_id: str = DEFAULT_CONV_ID):
@@ -57,6 +139,7 @@ class PDFStorage:
         ).resolve()
         self.conv_id = conv_id
         self.conv_dir = self.base_dir / conv_id
+        self.index_path = self.base_dir / INDEX_DB_NAME
         self._ensure_dirs()
 
     def _ensure_dirs(self) -> None:
@@ -64,20 +147,36 @@ class PDFStorage:
         self.conv_dir.mkdir(parents=True, exist_ok=True)
 
     @staticmethod
-    def _content_hash(content: str) -> str:
+    def hash_content(content: str) -> str:
         """Generate a short hash from the content."""
         return hashlib.sha256(content.encode()).hexdigest()[:8]
 
-    def _generate_filename(self, title: str, content: str) -> str:
+    def _generate_filename(self, title: str) -> str:
         """Generate a unique filename for a PDF."""
         timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-        content_hash = self._content_hash(content)
+        # Only needs to disambiguate; the content hash lives in the metadata
+        suffix = secrets.token_hex(4)
 
         # Create safe title slug
-        safe_title = "".join(c if c.isalnum() else "_" for c in title[:30])
+        safe_title = title[:30].translate(_TITLE_CHARS)
         safe_title = safe_title.strip("_") or "document"
 
-        return f"{safe_title}_{timestamp}_{content_hash}.pdf"
+        return f"{safe_title}_{timestamp}_{suffix}.pdf"
+
+    def reserve_pdf_path(self, title: str) -> Path:
+        """
+        Choose the path for a new PDF without writing anything.
+
+        Lets the converter move its output straight into place,
+        then record it with record_pdf_metadata().
+
+        Args:
+            title: Document title
+
+        Returns:
+            Path where the PDF should be written
+        """
+        return self.conv_dir / self._generate_filename(title)
 
     def save_pdf(
         self,
@@ -108,13 +207,56 @@ class PDFStorage:
         Returns:
             Tuple of (pdf_path, metadata)
         """
-        filename = self._generate_filename(title, content)
-        pdf_path = self.conv_dir / filename
-        metadata_path = self.conv_dir / f"{filename}.json"
+        pdf_path = self.reserve_pdf_path(title)
 
         # Save PDF
         pdf_path.write_bytes(pdf_bytes)
 
+        metadata = self.record_pdf_metadata(
+            pdf_path=pdf_path,
+            content_hash=self.hash_content(content),
+            title=title,
+            author=author,
+            style=style,
+            paper_size=paper_size,
+            font_size=font_size,
+            has_cover_page=has_cover_page,
+            has_toc=has_toc,
+        )
+
+        return pdf_path, metadata
+
+    def record_pdf_metadata(
+        self,
+        pdf_path: Path,
+        content_hash: str,
+        title: str,
+        author: str,
+        style: str,
+        paper_size: str,
+        font_size: str,
+        has_cover_page: bool,
+        has_toc: bool,
+    ) -> PDFMetadata:
+        """
+        Write the metadata sidecar for a PDF already on disk.
+
+        Args:
+            pdf_path: Path of the saved PDF (see reserve_pdf_path())
+            content_hash: Hash of the Markdown content (see hash_content())
+            title: Document title
+            author: Author name
+            style: Style used
+            paper_size: Paper size
+            font_size: Font size
+            has_cover_page: Whether cover page was included
+            has_toc: Whether TOC was included
+
+        Returns:
+            The written PDFMetadata
+        """
+        metadata_path = pdf_path.with_name(f"{pdf_path.name}.json")
+
         # Create and save metadata
         metadata = PDFMetadata(
             local_path=str(pdf_path),
@@ -125,12 +267,55 @@ class PDFStorage:
             font_size=font_size,
             has_cover_page=has_cover_page,
             has_toc=has_toc,
-            content_hash=self._content_hash(content),
+            content_hash=content_hash,
         )
 
-        metadata_path.write_text(json.dumps(metadata.to_dict(), indent=2))
+        metadata_path.write_bytes(_dump_json(metadata.to_dict()))
 
-        return pdf_path, metadata
+        with _index_lock:
+            conn = _open_index(self.index_path)
+            self._index_pdf(conn, metadata)
+
+        return metadata
+
+    def _index_pdf(self, conn: sqlite3.Connection, metadata: PDFMetadata) -> None:
+        """Insert or update a PDF's row in the index."""
+        conn.execute(
+            f"INSERT OR REPLACE INTO pdfs (conv_id, {', '.join(_METADATA_COLUMNS)}) "
+            f"VALUES (?, {', '.join('?' * len(_METADATA_COLUMNS))})",
+            (self.conv_id, *(getattr(metadata, col) for col in _METADATA_COLUMNS)),
+        )
+
+    def _ensure_indexed(self, conn: sqlite3.Connection) -> None:
+        """Import this conversation's existing JSON metadata files on first use."""
+        if conn.execute(
+            "SELECT 1 FROM indexed_conversations WHERE conv_id = ?",
+            (self.conv_id,),
+        ).fetchone():
+            return
+
+        conn.execute("BEGIN")
+        try:
+            with os.scandir(self.conv_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json") or not entry.is_file():
+                        continue
+                    try:
+                        with open(entry.path, "rb") as f:
+                            metadata = PDFMetadata.from_dict(_load_json(f.read()))
+                    except (json.JSONDecodeError, TypeError, KeyError):
+                        # Skip invalid metadata files
+                        continue
+                    self._index_pdf(conn, metadata)
+
+            conn.execute(
+                "INSERT INTO indexed_conversations (conv_id) VALUES (?)",
+                (self.conv_id,),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
 
     def list_pdfs(self, limit: int = 20) -> list[PDFMetadata]:
         """
@@ -142,26 +327,26 @@ class PDFStorage:
         Returns:
             List of PDFMetadata, sorted by creation time (newest first)
         """
-        pdfs = []
+        with _index_lock:
+            conn = _open_index(self.index_path)
+            self._ensure_indexed(conn)
+            rows = conn.execute(
+                f"SELECT {', '.join(_METADATA_COLUMNS)} FROM pdfs "
+                "WHERE conv_id = ? ORDER BY created_at DESC LIMIT ?",
+                (self.conv_id, limit),
+            ).fetchall()
 
-        # Find all .json metadata files in conversation directory
-        metadata_files = sorted(
-            self.conv_dir.glob("*.json"),
-            key=lambda p: p.stat().st_mtime,
-            reverse=True,
-        )
+        pdfs = []
 
-        for meta_path in metadata_files[:limit]:
-            try:
-                data = json.loads(meta_path.read_text())
-                metadata = PDFMetadata.from_dict(data)
+        for row in rows:
+            metadata = PDFMetadata.from_dict(dict(zip(_METADATA_COLUMNS, row)))
+            # SQLite hands booleans back as integers
+            metadata.has_cover_page = bool(metadata.has_cover_page)
+            metadata.has_toc = bool(metadata.has_toc)
 
-                # Verify the PDF file still exists
-                if Path(metadata.local_path).exists():
-                    pdfs.append(metadata)
-            except (json.JSONDecodeError, TypeError, KeyError):
-                # Skip invalid metadata files
-                continue
+            # Verify the PDF file still exists
+            if Path(metadata.local_path).exists():
+                pdfs.append(metadata)
 
         return pdfs
 
@@ -181,7 +366,7 @@ class PDFStorage:
             return None
 
         try:
-            data = json.loads(metadata_path.read_text())
+            data = _load_json(metadata_path.read_bytes())
             return PDFMetadata.from_dict(data)
         except (json.JSONDecodeError, TypeError, KeyError):
             return None
@@ -209,4 +394,8 @@ class PDFStorage:
             metadata_path.unlink()
             deleted = True
 
+        with _index_lock:
+            conn = _open_index(self.index_path)
+            conn.execute("DELETE FROM pdfs WHERE local_path = ?", (str(pdf_path),))
+
         return deleted
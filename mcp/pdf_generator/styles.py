@@ -93,12 +93,21 @@ def get_style_latex_header(style: StyleConfig) -> str:
     """
     Generate LaTeX header configuration for a style.
 
+    Headers for the built-in STYLES are generated once at import.
+
     Args:
         style: The style configuration
 
     Returns:
         LaTeX header commands as a string
     """
+    if STYLES.get(style.name) is style:
+        return _STYLE_HEADERS[style.name]
+    return _build_style_latex_header(style)
+
+
+def _build_style_latex_header(style: StyleConfig) -> str:
+    """Build the LaTeX header commands for a style."""
     lines = []
 
     # Font family
@@ -131,11 +140,20 @@ def get_style_latex_header(style: StyleConfig) -> str:
     return "\n".join(lines)
 
 
+# Styles are fixed at import, so render their headers and info once
+_STYLE_HEADERS: dict[str, str] = {
+    name: _build_style_latex_header(style) for name, style in STYLES.items()
+}
+_STYLE_INFO: dict[str, dict[str, str]] = {
+    name: {"description": style.description} for name, style in STYLES.items()
+}
+
+
 def get_style_info() -> dict[str, dict[str, str]]:
     """
     Get information about all available styles.
 
     Returns:
-        Dictionary mapping style names to their descriptions
+        Dictionary mapping style names to their descriptions (shared; don't mutate)
     """
-    return {name: {"description": style.description} for name, style in STYLES.items()}
+    return _STYLE_INFO
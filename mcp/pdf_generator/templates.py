@@ -6,12 +6,68 @@ Provides cover page templates and document configuration.
 
 from __future__ import annotations
 
+import functools
+import re
 from datetime import date
 
 try:
-    from .styles import StyleConfig
+    from .styles import STYLES, StyleConfig, get_style_latex_header
 except ImportError:
-    from styles import StyleConfig
+    from styles import STYLES, StyleConfig, get_style_latex_header
+
+# Essential packages for Markdown conversion
+_FIXED_PACKAGES = "\n".join([
+    r"\usepackage{longtable}",  # For tables
+    r"\usepackage{booktabs}",  # Better table formatting
+    r"\usepackage{graphicx}",  # For images
+    r"\usepackage{amsmath}",  # For math
+    r"\usepackage{amssymb}",  # Math symbols
+    r"\usepackage{listings}",  # Code blocks
+    r"\usepackage{float}",  # Figure placement
+])
+
+# Code block styling
+_LSTSET_BLOCK = r"""
+\lstset{
+    basicstyle=\ttfamily\small,
+    breaklines=true,
+    frame=single,
+    backgroundcolor=\color{gray!10},
+    numbers=left,
+    numberstyle=\tiny\color{gray},
+    tabsize=4
+}
+"""
+
+# Everything before the style-specific configuration
+_HEADER_PREFIX = f"{_FIXED_PACKAGES}\n{_LSTSET_BLOCK}\n"
+
+# Add page break after table of contents
+_TOC_BLOCK = r"""
+% Redefine TOC to add page break after it
+\let\oldtableofcontents\tableofcontents
+\renewcommand{\tableofcontents}{\oldtableofcontents\newpage}
+"""
+
+# Characters that need escaping in LaTeX. Translated in a single pass, so the
+# braces of \textbackslash{} aren't escaped again as they were by chained
+# str.replace calls.
+_LATEX_ESCAPES = str.maketrans({
+    "\\": r"\textbackslash{}",
+    "&": r"\&",
+    "%": r"\%",
+    "$": r"\$",
+    "#": r"\#",
+    "_": r"\_",
+    "{": r"\{",
+    "}": r"\}",
+    "~": r"\textasciitilde{}",
+    "^": r"\textasciicircum{}",
+})
+_LATEX_SPECIAL_RE = re.compile(r"[\\&%$#_{}~^]")
+
+# (date, formatted) of the last default cover page date
+_today_cache: tuple[date, str] | None = None
 
 
 def get_cover_page_template(
@@ -32,13 +88,10 @@ def get_cover_page_template(
     Returns:
         LaTeX code for the title page
     """
-    if not doc_date:
-        doc_date = date.today().strftime("%d %B %Y")
-
-    # Escape LaTeX special characters
+    # Escape LaTeX special characters (the default date has none)
     title = escape_latex(title)
-    author = escape_latex(author)
-    doc_date = escape_latex(doc_date)
+    author = escape_latex(author) if author else ""
+    doc_date = escape_latex(doc_date) if doc_date else _today_string()
 
     return rf"""
 \begin{{titlepage}}
@@ -55,65 +108,48 @@ def get_cover_page_template(
 """
 
 
-def get_document_header(
-    style: StyleConfig,
-    paper_size: str = "a4",
-    font_size: str = "11pt",
-    toc: bool = False,
-) -> str:
+def _today_string() -> str:
+    """Today's date for the cover page, formatted once per day."""
+    global _today_cache
+
+    today = date.today()
+    if _today_cache is None or _today_cache[0] != today:
+        _today_cache = (today, today.strftime("%d %B %Y"))
+    return _today_cache[1]
+
+
+def get_document_header(style: StyleConfig, toc: bool = False) -> str:
     """
     Generate the LaTeX document header/preamble additions.
 
+    Paper and font size aren't part of the header; they are passed to
+    Pandoc as the papersize and fontsize variables.
+
     Args:
         style: Style configuration
-        paper_size: Paper size (a4, letter, legal)
-        font_size: Font size (10pt, 11pt, 12pt)
         toc: Whether to include table of contents
 
     Returns:
         LaTeX preamble additions
     """
-    try:
-        from .styles import get_style_latex_header
-    except ImportError:
-        from styles import get_style_latex_header
-
-    lines = []
-
-    # Essential packages for Markdown conversion
-    lines.append(r"\usepackage{longtable}")  # For tables
-    lines.append(r"\usepackage{booktabs}")  # Better table formatting
-    lines.append(r"\usepackage{graphicx}")  # For images
-    lines.append(r"\usepackage{amsmath}")  # For math
-    lines.append(r"\usepackage{amssymb}")  # Math symbols
-    lines.append(r"\usepackage{listings}")  # Code blocks
-    lines.append(r"\usepackage{float}")  # Figure placement
-
-    # Code block styling
-    lines.append(r"""
-\lstset{
-    basicstyle=\ttfamily\small,
-    breaklines=true,
-    frame=single,
-    backgroundcolor=\color{gray!10},
-    numbers=left,
-    numberstyle=\tiny\color{gray},
-    tabsize=4
-}
-""")
+    # Built-in styles are cached by name
+    if STYLES.get(style.name) is style:
+        return _get_document_header_by_name(style.name, toc)
+    return _build_document_header(style, toc)
 
-    # Style-specific configuration
-    lines.append(get_style_latex_header(style))
 
-    # Add page break after table of contents
-    if toc:
-        lines.append(r"""
-% Redefine TOC to add page break after it
-\let\oldtableofcontents\tableofcontents
-\renewcommand{\tableofcontents}{\oldtableofcontents\newpage}
-""")
+@functools.lru_cache(maxsize=16)
+def _get_document_header_by_name(style_name: str, toc: bool) -> str:
+    """Cached document header for a built-in style."""
+    return _build_document_header(STYLES[style_name], toc)
+
 
-    return "\n".join(lines)
+def _build_document_header(style: StyleConfig, toc: bool) -> str:
+    """Build the LaTeX preamble additions for a style."""
+    header = _HEADER_PREFIX + get_style_latex_header(style)
+    if toc:
+        header += "\n" + _TOC_BLOCK
+    return header
 
 
 def escape_latex(text: str) -> str:
@@ -129,21 +165,8 @@ def escape_latex(text: str) -> str:
     if not text:
         return ""
 
-    # Characters that need escaping in LaTeX
-    replacements = [
-        ("\\", r"\textbackslash{}"),
-        ("&", r"\&"),
-        ("%", r"\%"),
-        ("$", r"\$"),
-        ("#", r"\#"),
-        ("_", r"\_"),
-        ("{", r"\{"),
-        ("}", r"\}"),
-        ("~", r"\textasciitilde{}"),
-        ("^", r"\textasciicircum{}"),
-    ]
-
-    for char, replacement in replacements:
-        text = text.replace(char, replacement)
-
-    return text
+    # Most titles and authors are clean: return them without copying
+    if _LATEX_SPECIAL_RE.search(text) is None:
+        return text
+
+    return text.translate(_LATEX_ESCAPES)
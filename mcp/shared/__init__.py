@@ -1,5 +1,6 @@
 """Shared utilities for MCP servers."""
 
-from .context import get_conversation_id, DEFAULT_CONV_ID
+from .context import get_conversation_id, DEFAULT_CONV_ID, SAFE_CHARS, SafeCharTable
+from .files import serve_conversation_file
 
-__all__ = ["get_conversation_id", "DEFAULT_CONV_ID"]
+__all__ = ["get_conversation_id", "DEFAULT_CONV_ID", "SAFE_CHARS", "SafeCharTable", "serve_conversation_file"]
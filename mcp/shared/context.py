@@ -15,6 +15,36 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 DEFAULT_CONV_ID = "_shared"
+_CONV_HEADER = "X-Conversation-ID"
+
+
+class SafeCharTable(dict):
+    """
+    str.translate table keeping alphanumerics and `keep`, mapping the rest to "_".
+
+    ASCII entries are filled in up front. Other code points are worked out on
+    every lookup instead of being stored: they come from untrusted input (URL
+    paths, headers, titles), so memoizing them would let clients grow the
+    table without bound.
+
+    Args:
+        keep: ASCII characters to keep besides alphanumerics
+    """
+
+    def __init__(self, keep: str = "-_"):
+        super().__init__(
+            (i, i if chr(i).isalnum() or chr(i) in keep else ord("_"))
+            for i in range(0x80)
+        )
+
+    def __missing__(self, codepoint: int) -> int:
+        return codepoint if chr(codepoint).isalnum() else ord("_")
+
+
+# Path component sanitizer (prevents path traversal)
+SAFE_CHARS = SafeCharTable()
+# Same mapping as a bytes.translate table, for the common all-ASCII case
+_ASCII_SAFE_BYTES = bytes(SAFE_CHARS[i] if i < 0x80 else ord("_") for i in range(256))
 
 
 def get_conversation_id(ctx: "Context") -> str:
@@ -30,20 +60,25 @@ def get_conversation_id(ctx: "Context") -> str:
     Returns:
         Sanitized conversation ID or "_shared" as fallback
     """
-    conv_id = DEFAULT_CONV_ID
-
     try:
-        if ctx.request_context and ctx.request_context.request:
-            raw_conv_id = ctx.request_context.request.headers.get("X-Conversation-ID")
-            if raw_conv_id:
-                # Sanitize: only allow alphanumeric, hyphens, and underscores
-                # This prevents path traversal attacks
-                conv_id = "".join(
-                    c if c.isalnum() or c in "-_" else "_"
-                    for c in raw_conv_id[:64]  # Limit length
-                )
-                logger.debug("Conversation ID from header: %s", conv_id)
+        request = ctx.request_context.request
+        # No HTTP request on the stdio transport
+        raw_conv_id = request.headers.get(_CONV_HEADER) if request is not None else None
     except Exception as e:
         logger.warning("Failed to extract conversation ID: %s", e)
+        return DEFAULT_CONV_ID
+
+    if not raw_conv_id:
+        return DEFAULT_CONV_ID
+
+    # Sanitize: only allow alphanumeric, hyphens, and underscores
+    # This prevents path traversal attacks
+    raw_conv_id = raw_conv_id[:64]  # Limit length
+    if raw_conv_id.isascii():
+        conv_id = raw_conv_id.encode("ascii").translate(_ASCII_SAFE_BYTES).decode("ascii")
+    else:
+        conv_id = raw_conv_id.translate(SAFE_CHARS)
 
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Conversation ID from header: %s", conv_id)
     return conv_id
@@ -0,0 +1,92 @@
+"""
+File serving for MCP servers.
+
+Provides the handler behind each server's /files/{conv_id}/{filename} route.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import stat
+from pathlib import Path
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from .context import SAFE_CHARS
+
+# Only used for Starlette's conditional GET check (is_not_modified)
+_conditional_get = StaticFiles(check_dir=False)
+
+
+async def serve_conversation_file(request: Request, data_dir: Path) -> Response:
+    """
+    Serve data_dir/<conv_id>/<filename> for a /files/{conv_id}/{filename} route.
+
+    Generated files never change in place, so repeat fetches can be 304s.
+
+    Args:
+        request: Request carrying the conv_id and filename path parameters
+        data_dir: The server's data directory (already resolved)
+
+    Returns:
+        The file, a 304 for a matching conditional GET, or a 404
+    """
+    conv_id = request.path_params.get("conv_id", "_shared")
+    filename = request.path_params.get("filename", "")
+
+    # Sanitize inputs to prevent path traversal
+    safe_conv_id = conv_id[:64].translate(SAFE_CHARS)
+    safe_filename = Path(filename).name  # Remove any path components
+
+    # Stat in a worker thread so a slow disk doesn't stall the event loop
+    try:
+        stat_result = await asyncio.to_thread(
+            _prepare_file, data_dir, safe_conv_id, safe_filename
+        )
+    except OSError:
+        return Response(content="File not found", status_code=404)
+    if not stat.S_ISREG(stat_result.st_mode):
+        return Response(content="File not found", status_code=404)
+
+    # Pass the stat result along so FileResponse doesn't stat the file again
+    response = FileResponse(data_dir / safe_conv_id / safe_filename, stat_result=stat_result)
+
+    if _conditional_get.is_not_modified(response.headers, request.headers):
+        return NotModifiedResponse(response.headers)
+    return response
+
+
+def _prepare_file(data_dir: Path, conv_id: str, filename: str) -> os.stat_result:
+    """
+    Stat a file about to be served and start reading it into the page cache.
+
+    Both path components are sanitized and data_dir is resolved, so the join
+    stays inside data_dir unless a component is a symlink. The conversation
+    directory and the file are each opened with O_NOFOLLOW (the file relative
+    to the directory's descriptor), which rules out links pointing elsewhere
+    without realpath calls.
+
+    Raises:
+        OSError: If either component is missing or is a symlink
+    """
+    dir_fd = os.open(data_dir / conv_id, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+    try:
+        fd = os.open(
+            filename,
+            os.O_RDONLY | os.O_NOFOLLOW | getattr(os, "O_NONBLOCK", 0),
+            dir_fd=dir_fd,
+        )
+    finally:
+        os.close(dir_fd)
+
+    try:
+        stat_result = os.fstat(fd)
+        if stat.S_ISREG(stat_result.st_mode) and hasattr(os, "posix_fadvise"):
+            # Readahead populates the shared page cache, so sendfile finds it warm
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        return stat_result
+    finally:
+        os.close(fd)